@@ -1,13 +1,30 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import time
 import json
+import asyncio
+import signal
 import socket
 import psutil
 import netifaces
 import logging
-from typing import Dict, Any
+import paho.mqtt.client as mqtt
+from typing import Dict, Any, Optional, Tuple
+
+# Byte unit divisors
+GiB = 1024 ** 3
+TiB = 1024 ** 4
+
+# Storage display units, largest first
+STORAGE_UNITS = ((TiB, 'T'), (GiB, 'G'))
+
+# "model name" line in the first processor block of /proc/cpuinfo
+CPU_MODEL_PATTERN = re.compile(rb'model name\s*:\s*(.+)')
+
+# Interface name prefixes considered for the primary network interface
+PRIMARY_IFACE_PREFIXES = ('eth', 'wlan', 'en', 'wlp', 'wls')
 
 # Configure logging
 logging.basicConfig(
@@ -16,40 +33,81 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+def format_storage_capacity(value_bytes: int) -> str:
+    """Format storage capacity to human-readable format"""
+    for divisor, unit in STORAGE_UNITS:
+        if value_bytes >= divisor:
+            return f"{value_bytes / divisor:.2f} {unit}"
+    return f"{value_bytes} B"
+
 class MachineStatusPublisher:
     def __init__(
         self, 
-        database_url: str = None,
-        publish_interval: int = 60
+        broker_address: str = 'localhost',
+        broker_port: int = 1883,
+        username: str = None,
+        password: str = None,
+        publish_interval: int = 60,
+        batch_size: int = 1
     ):
         """
         Initialize Machine Status Publisher
         
-        :param database_url: Database connection URL
+        :param broker_address: MQTT Broker address
+        :param broker_port: MQTT Broker port
+        :param username: MQTT Broker username
+        :param password: MQTT Broker password
         :param publish_interval: Interval between status updates in seconds
+        :param batch_size: Status snapshots sent together in one MQTT message
         """
         self.publish_interval = publish_interval
         
-        # Load database connection details
-        self.database_url = database_url or self._load_database_url()
+        # Snapshots buffered until a full batch is published as a JSON array
+        self.batch_size = max(1, batch_size)
+        self._batch = []
+        
+        # Discover the primary interface once; SIGHUP triggers a re-discovery
+        self._primary_iface = self._discover_primary_iface()
         
         # Generate unique machine ID
         self.machine_id = self._get_machine_id()
+        
+        # Machine facts that do not change while the process runs
+        self.hostname = socket.gethostname()
+        self.cpu_model = self._get_cpu_model()
+        self.cpu_cores = psutil.cpu_count()
+        self.memory_total = f"{psutil.virtual_memory().total / GiB:.2f} GB"
+        self.storage_total = format_storage_capacity(psutil.disk_usage('/').total)
+        
+        # Prime the CPU counters; the first non-blocking call always returns 0.0
+        psutil.cpu_percent(interval=None)
+        
+        # Persistent MQTT connection; paho's network thread reconnects on its own
+        self.topic = f"machine_status/{self.machine_id}"
+        self.broker_address = broker_address
+        self.broker_port = broker_port
+        self.client = mqtt.Client()
+        if username and password:
+            self.client.username_pw_set(username, password)
 
-    def _load_database_url(self) -> str:
+    def _discover_primary_iface(self) -> Tuple[Optional[str], str]:
         """
-        Load database connection URL from environment file
+        Find the primary network interface in a single netifaces sweep
         
-        :return: Database connection URL
+        :return: Tuple of (MAC address or None, IPv4 address or "")
         """
         try:
-            with open('/etc/machine-status/db.env', 'r') as f:
-                for line in f:
-                    if line.startswith('DATABASE_URL='):
-                        return line.split('=', 1)[1].strip()
+            for iface in netifaces.interfaces():
+                if iface.startswith(PRIMARY_IFACE_PREFIXES):
+                    addrs = netifaces.ifaddresses(iface)
+                    if netifaces.AF_LINK in addrs:
+                        return (
+                            addrs[netifaces.AF_LINK][0].get('addr'),
+                            addrs.get(netifaces.AF_INET, [{}])[0].get('addr', '')
+                        )
         except Exception as e:
-            logging.error(f"Failed to load database URL: {e}")
-            raise
+            logging.error(f"Failed to discover primary network interface: {e}")
+        return None, ""
 
     def _get_machine_id(self) -> str:
         """
@@ -57,123 +115,148 @@ class MachineStatusPublisher:
         
         :return: Unique machine identifier (MAC address)
         """
-        try:
-            # Get MAC address of primary network interface
-            interfaces = netifaces.interfaces()
-            for iface in interfaces:
-                if iface.startswith(('eth', 'wlan', 'en', 'wlp')):
-                    addrs = netifaces.ifaddresses(iface)
-                    if netifaces.AF_LINK in addrs:
-                        return addrs[netifaces.AF_LINK][0]['addr']
-        except Exception as e:
-            logging.error(f"Failed to get MAC address: {e}")
+        mac_address = self._primary_iface[0]
+        if mac_address:
+            return mac_address
         
         # Fallback to hostname if MAC address retrieval fails
         return socket.gethostname()
 
+    def _get_cpu_model(self) -> str:
+        """
+        Get CPU model information
+        
+        :return: CPU model name
+        """
+        try:
+            # The model name is in the first processor block, so the first
+            # 4 KiB is enough regardless of core count
+            with open('/proc/cpuinfo', 'rb') as f:
+                head = f.read(4096)
+            match = CPU_MODEL_PATTERN.search(head)
+            if match:
+                return match.group(1).decode('ascii', 'replace').strip()
+        except Exception as e:
+            logging.error(f"Failed to read CPU model: {e}")
+        return "Unknown CPU"
+
+    def _refresh_facts(self):
+        """
+        Re-discover the hostname and primary interface (SIGHUP handler)
+        
+        The machine ID stays the one derived at startup.
+        """
+        self.hostname = socket.gethostname()
+        self._primary_iface = self._discover_primary_iface()
+        logging.info(f"Refreshed machine facts: {self.hostname} {self._primary_iface[1]}")
+
     def _get_machine_info(self) -> Dict[str, Any]:
         """
         Collect comprehensive machine information
         
         :return: Dictionary of machine information
         """
-        def format_storage_capacity(value_bytes: int) -> str:
-            """Format storage capacity to human-readable format"""
-            if value_bytes >= 1024 ** 4:  # 1 TB
-                return f"{value_bytes / (1024 ** 4):.2f} T"
-            elif value_bytes >= 1024 ** 3:  # 1 GB
-                return f"{value_bytes / (1024 ** 3):.2f} G"
-            else:
-                return f"{value_bytes} B"
-
-        def get_network_info() -> str:
-            """Get primary network interface IP"""
-            interfaces = netifaces.interfaces()
-            for iface in interfaces:
-                if iface.startswith(('wlp', 'wls', 'eth', 'en')):
-                    addrs = netifaces.ifaddresses(iface)
-                    if netifaces.AF_INET in addrs:
-                        return addrs[netifaces.AF_INET][0]['addr']
-            return ""
-
-        def get_cpu_model() -> str:
-            """Get CPU model information"""
-            try:
-                with open('/proc/cpuinfo', 'r') as f:
-                    for line in f:
-                        if "model name" in line:
-                            return line.split(':')[1].strip()
-            except Exception as e:
-                logging.error(f"Failed to read CPU model: {e}")
-            return "Unknown CPU"
+        # One pass over the volatile counters; static facts come from __init__
+        cpu_usage = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
 
         # Collect comprehensive system information
         return {
             "machine_id": self.machine_id,
-            "hostname": socket.gethostname(),
-            "ip_address": get_network_info(),
+            "hostname": self.hostname,
+            "ip_address": self._primary_iface[1],
             "cpu": {
-                "model": get_cpu_model(),
-                "cores": psutil.cpu_count(),
-                "usage_percent": psutil.cpu_percent()
+                "model": self.cpu_model,
+                "cores": self.cpu_cores,
+                "usage_percent": cpu_usage
             },
             "memory": {
-                "total": f"{psutil.virtual_memory().total / (1024 ** 3):.2f} GB",
-                "available": f"{psutil.virtual_memory().available / (1024 ** 3):.2f} GB",
-                "usage_percent": psutil.virtual_memory().percent
+                "total": self.memory_total,
+                "available": f"{memory.available / GiB:.2f} GB",
+                "usage_percent": memory.percent
             },
             "storage": {
-                "total": format_storage_capacity(psutil.disk_usage('/').total),
-                "free": format_storage_capacity(psutil.disk_usage('/').free),
-                "usage_percent": psutil.disk_usage('/').percent
+                "total": self.storage_total,
+                "free": format_storage_capacity(disk.free),
+                "usage_percent": disk.percent
             },
             "timestamp": time.time()
         }
 
     def publish_status(self):
         """
-        Publish machine status to database or logging
+        Publish machine status to the MQTT broker
         """
         try:
             # Get current machine information
-            machine_info = self._get_machine_info()
+            self._batch.append(self._get_machine_info())
+            if len(self._batch) < self.batch_size:
+                return
+            
+            # A single snapshot is sent as-is, a batch as a list
+            batch, self._batch = self._batch, []
+            payload = json.dumps(batch if self.batch_size > 1 else batch[0])
             
-            # Log the information
-            logging.info(f"Machine Status: {json.dumps(machine_info, indent=2)}")
+            # Log the information (only when debug logging is on)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Machine Status: %s", payload)
             
-            # TODO: Add database insertion logic here if needed
+            result = self.client.publish(self.topic, payload, qos=0, retain=False)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                logging.warning(f"Failed to publish machine status. Return code: {result.rc}")
         
         except Exception as e:
             logging.error(f"Error publishing machine status: {e}")
 
-    def run(self):
+    async def run(self):
         """
         Run the machine status publisher
         """
         try:
             logging.info("Starting Machine Status Publisher")
             
-            # Publish status periodically
+            # Connect once and keep the connection open between publishes
+            self.client.connect(self.broker_address, self.broker_port, 60)
+            self.client.loop_start()
+            
+            # Reload cached network facts on demand (e.g. after a DHCP change)
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self._refresh_facts)
+            
+            # Publish status periodically without blocking the event loop
             while True:
                 self.publish_status()
-                time.sleep(self.publish_interval)
+                await asyncio.sleep(self.publish_interval)
         
+        except asyncio.CancelledError:
+            logging.info("Stopping Machine Status Publisher")
+            raise
         except Exception as e:
             logging.error(f"Fatal error in publisher: {e}")
+        finally:
+            self.client.loop_stop()
+            self.client.disconnect()
 
 def main():
     # Configuration from environment or defaults
     PUBLISH_INTERVAL = int(os.getenv('PUBLISH_INTERVAL', 60))
-    DATABASE_URL = os.getenv('DATABASE_URL')
+    PUBLISH_BATCH_SIZE = int(os.getenv('PUBLISH_BATCH_SIZE', 1))
 
     # Create and run publisher
     publisher = MachineStatusPublisher(
-        database_url=DATABASE_URL,
-        publish_interval=PUBLISH_INTERVAL
+        broker_address=os.getenv('MQTT_BROKER_ADDRESS', 'localhost'),
+        broker_port=int(os.getenv('MQTT_BROKER_PORT', 1883)),
+        username=os.getenv('MQTT_USERNAME'),
+        password=os.getenv('MQTT_PASSWORD'),
+        publish_interval=PUBLISH_INTERVAL,
+        batch_size=PUBLISH_BATCH_SIZE
     )
     
-    # Run the publisher
-    publisher.run()
+    # Run the publisher; Ctrl+C cancels run(), which has already logged the stop
+    try:
+        asyncio.run(publisher.run())
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,13 +2,20 @@
 
 import os
 import json
+import queue
 import logging
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, List, Optional
 
 import paho.mqtt.client as mqtt
 import sqlalchemy as sa
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from sqlalchemy.ext.declarative import declarative_base
+try:
+    import orjson
+    has_orjson = True
+except ImportError:
+    has_orjson = False
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +24,20 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Batched database writes
+QUEUE_MAXSIZE = 10000  # Parsed messages buffered before on_message blocks
+BULK_SIZE = 500  # Maximum rows per INSERT
+FLUSH_TIMEOUT_MS = 100  # Maximum wait for more rows before flushing a partial batch
+
+# Time span of each TimescaleDB chunk when the extension is available
+HYPERTABLE_CHUNK_INTERVAL = '1 day'
+
+# Unit letters of human-readable sizes ("15.42 GB", "2.00 T"), by power of 1024
+BYTE_UNIT_PREFIXES = 'BKMGTP'
+
+# Size columns stored as byte counts (formerly formatted strings)
+BYTE_COLUMNS = ('memory_total', 'memory_available', 'storage_total', 'storage_free')
+
 # SQLAlchemy Base and Session setup
 Base = declarative_base()
 
@@ -25,21 +46,54 @@ class MachineStatus(Base):
     Database model to store machine status information
     """
     __tablename__ = 'machine_statuses'
+    __table_args__ = (
+        # BRIN instead of a btree keeps the insert path cheap as the table grows
+        sa.Index('ix_ms_ts_brin', 'timestamp', postgresql_using='brin'),
+    )
 
-    id = sa.Column(sa.Integer, primary_key=True)
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
     machine_id = sa.Column(sa.String(255), nullable=False, index=True)
     hostname = sa.Column(sa.String(255), nullable=False)
     ip_address = sa.Column(sa.String(100))
     cpu_model = sa.Column(sa.String(255))
     cpu_cores = sa.Column(sa.Integer)
     cpu_usage = sa.Column(sa.Float)
-    memory_total = sa.Column(sa.String(50))
-    memory_available = sa.Column(sa.String(50))
+    memory_total = sa.Column(sa.BigInteger)
+    memory_available = sa.Column(sa.BigInteger)
     memory_usage = sa.Column(sa.Float)
-    storage_total = sa.Column(sa.String(50))
-    storage_free = sa.Column(sa.String(50))
+    storage_total = sa.Column(sa.BigInteger)
+    storage_free = sa.Column(sa.BigInteger)
     storage_usage = sa.Column(sa.Float)
-    timestamp = sa.Column(sa.DateTime, server_default=sa.func.now())
+    # Added to the primary key on PostgreSQL so the table can be partitioned on it
+    timestamp = sa.Column(sa.DateTime, nullable=False, server_default=sa.func.now())
+
+def parse_byte_string(value: Any) -> Optional[int]:
+    """
+    Convert a human-readable size such as "15.42 GB" to bytes
+    
+    :param value: Formatted size string or raw number
+    :return: Byte count, or None if the value cannot be parsed
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        number, unit = str(value).split()
+        return int(float(number) * 1024 ** BYTE_UNIT_PREFIXES.index(unit[0].upper()))
+    except (ValueError, IndexError):
+        return None
+
+def byte_count(section: Dict[str, Any], key: str) -> Optional[int]:
+    """
+    Read a size from a payload section, preferring a raw "<key>_bytes" field
+    over the formatted "<key>" string
+    
+    :param section: Payload section such as machine_info['memory']
+    :param key: Field name within the section
+    :return: Byte count, or None if missing or unparseable
+    """
+    if f'{key}_bytes' in section:
+        return section[f'{key}_bytes']
+    return parse_byte_string(section.get(key))
 
 class MachineStatusSubscriber:
     def __init__(
@@ -72,7 +126,20 @@ class MachineStatusSubscriber:
             )
         self.engine = sa.create_engine(database_url)
         Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
+        self._migrate_byte_columns()
+        self._create_hypertable()
+        
+        # Received statuses are queued here and written in batches by the writer thread
+        self._queue = queue.Queue(maxsize=QUEUE_MAXSIZE)
+        if self.engine.dialect.name == 'postgresql':
+            # Rows that conflict with stored ones are skipped instead of failing the batch
+            self._insert_stmt = postgresql_insert(MachineStatus.__table__).on_conflict_do_nothing()
+        else:
+            self._insert_stmt = MachineStatus.__table__.insert()
+        self.running = True
+        self.writer_thread = threading.Thread(target=self._writer)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
 
         # Set up MQTT authentication
         if username and password:
@@ -83,6 +150,65 @@ class MachineStatusSubscriber:
         self.client.on_message = self._on_message
         self.client.on_disconnect = self._on_disconnect
 
+    def _migrate_byte_columns(self):
+        """
+        Convert formatted string size columns to BIGINT byte counts (PostgreSQL)
+        """
+        if self.engine.dialect.name != 'postgresql':
+            return
+        
+        table = MachineStatus.__tablename__
+        column_types = {
+            column['name']: column['type']
+            for column in sa.inspect(self.engine).get_columns(table)
+        }
+        with self.engine.begin() as conn:
+            for column in BYTE_COLUMNS:
+                if not isinstance(column_types.get(column), sa.String):
+                    continue
+                # "15.42 GB" -> 15.42 * 1024^3; anything unparseable becomes NULL
+                conn.execute(sa.text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT USING "
+                    f"CASE WHEN {column} ~ '^[0-9]+([.][0-9]+)? [{BYTE_UNIT_PREFIXES}]' "
+                    f"THEN CAST(CAST(split_part({column}, ' ', 1) AS NUMERIC) * "
+                    f"power(1024, strpos('{BYTE_UNIT_PREFIXES}', left(split_part({column}, ' ', 2), 1)) - 1) AS BIGINT) "
+                    f"END"
+                ))
+                logging.info(f"Migrated column {table}.{column} to BIGINT bytes")
+
+    def _create_hypertable(self):
+        """
+        Turn machine_statuses into a TimescaleDB hypertable when the extension is installed
+        """
+        if self.engine.dialect.name != 'postgresql':
+            return
+        
+        table = MachineStatus.__tablename__
+        try:
+            with self.engine.begin() as conn:
+                has_timescaledb = conn.execute(
+                    sa.text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+                ).scalar()
+                if not has_timescaledb:
+                    return
+                # Hypertables need the partitioning column in the primary key;
+                # other backends cannot autoincrement id in a composite key,
+                # so the model itself keeps id as the only key column
+                primary_key = sa.inspect(conn).get_pk_constraint(table)
+                if 'timestamp' not in primary_key['constrained_columns']:
+                    conn.execute(sa.text(
+                        f"ALTER TABLE {table} DROP CONSTRAINT {primary_key['name']}, "
+                        f"ADD PRIMARY KEY (id, timestamp)"
+                    ))
+                # Only the BRIN index on timestamp, not TimescaleDB's default btree
+                conn.execute(sa.text(
+                    f"SELECT create_hypertable('{table}', 'timestamp', "
+                    f"chunk_time_interval => INTERVAL '{HYPERTABLE_CHUNK_INTERVAL}', "
+                    f"create_default_indexes => FALSE, migrate_data => TRUE, if_not_exists => TRUE)"
+                ))
+        except Exception as e:
+            logging.warning(f"Keeping {table} as a plain table: {e}")
+
     def _on_connect(self, client, userdata, flags, rc):
         """
         MQTT connection callback
@@ -108,55 +234,126 @@ class MachineStatusSubscriber:
         :param msg: MQTT message
         """
         try:
-            # Decode payload
-            payload = msg.payload.decode('utf-8')
-            machine_info = json.loads(payload)
-            
-            # Store in database
-            self._store_machine_status(machine_info)
+            # Decode payload (orjson parses the raw bytes directly)
+            if has_orjson:
+                machine_info = orjson.loads(msg.payload)
+            else:
+                machine_info = json.loads(msg.payload.decode('utf-8'))
             
-            logging.info(f"Received status for machine {machine_info.get('machine_id')}")
+            # Batched publishers send a list of snapshots in one message
+            reports = machine_info if isinstance(machine_info, list) else [machine_info]
+            for report in reports:
+                # Store in database
+                self._store_machine_status(report)
+                
+                logging.info(f"Received status for machine {report.get('machine_id')}")
         
-        except json.JSONDecodeError:
+        except ValueError:
+            # json.JSONDecodeError and orjson.JSONDecodeError both subclass ValueError
             logging.error(f"Failed to decode JSON from topic {msg.topic}")
         except Exception as e:
             logging.error(f"Error processing message: {e}")
 
     def _store_machine_status(self, machine_info: Dict[str, Any]):
         """
-        Store machine status in database
+        Queue machine status for a batched database write
         
         :param machine_info: Dictionary of machine status information
         """
+        # Sections may be missing or null
+        cpu = machine_info.get('cpu') or {}
+        memory = machine_info.get('memory') or {}
+        storage = machine_info.get('storage') or {}
+        
+        # Blocks when the writer falls behind, pushing back on the broker
+        self._queue.put({
+            'machine_id': machine_info.get('machine_id', 'Unknown'),
+            'hostname': machine_info.get('hostname', 'Unknown'),
+            'ip_address': machine_info.get('ip_address', ''),
+            'cpu_model': cpu.get('model', 'Unknown'),
+            'cpu_cores': cpu.get('cores', 0),
+            'cpu_usage': cpu.get('usage_percent', 0),
+            'memory_total': byte_count(memory, 'total'),
+            'memory_available': byte_count(memory, 'available'),
+            'memory_usage': memory.get('usage_percent', 0),
+            'storage_total': byte_count(storage, 'total'),
+            'storage_free': byte_count(storage, 'free'),
+            'storage_usage': storage.get('usage_percent', 0)
+        })
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """
+        Collect up to BULK_SIZE queued rows
+        
+        Waits up to FLUSH_TIMEOUT_MS for the first row, then takes whatever
+        else is already queued without waiting.
+        
+        :return: List of row dictionaries, empty if nothing arrived
+        """
         try:
-            # Create database session
-            session = self.Session()
-            
-            # Create MachineStatus record
-            status_record = MachineStatus(
-                machine_id=machine_info.get('machine_id', 'Unknown'),
-                hostname=machine_info.get('hostname', 'Unknown'),
-                ip_address=machine_info.get('ip_address', ''),
-                cpu_model=machine_info.get('cpu', {}).get('model', 'Unknown'),
-                cpu_cores=machine_info.get('cpu', {}).get('cores', 0),
-                cpu_usage=machine_info.get('cpu', {}).get('usage_percent', 0),
-                memory_total=machine_info.get('memory', {}).get('total', 'Unknown'),
-                memory_available=machine_info.get('memory', {}).get('available', 'Unknown'),
-                memory_usage=machine_info.get('memory', {}).get('usage_percent', 0),
-                storage_total=machine_info.get('storage', {}).get('total', 'Unknown'),
-                storage_free=machine_info.get('storage', {}).get('free', 'Unknown'),
-                storage_usage=machine_info.get('storage', {}).get('usage_percent', 0)
-            )
-            
-            # Add and commit record
-            session.add(status_record)
-            session.commit()
+            batch = [self._queue.get(timeout=FLUSH_TIMEOUT_MS / 1000)]
+        except queue.Empty:
+            return []
+        
+        while len(batch) < BULK_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert_batch(self, conn: sa.engine.Connection, batch: List[Dict[str, Any]]):
+        """
+        Insert a batch of rows in one statement, falling back to row by row
+        
+        Uses a Core table insert, bypassing the ORM unit of work.
         
+        :param conn: Database connection owned by the writer thread
+        :param batch: List of row dictionaries
+        """
+        try:
+            with conn.begin():
+                conn.execute(self._insert_stmt, batch)
+            return
         except Exception as e:
-            session.rollback()
-            logging.error(f"Error storing machine status: {e}")
+            logging.error(f"Batch insert of {len(batch)} machine statuses failed, retrying row by row: {e}")
+        
+        # Isolate bad rows so one of them does not discard the whole batch
+        for row in batch:
+            try:
+                with conn.begin():
+                    conn.execute(self._insert_stmt, row)
+            except Exception as e:
+                logging.error(f"Error storing machine status for {row['machine_id']}: {e}")
+
+    def _writer(self):
+        """
+        Background thread writing queued statuses to the database
+        
+        Holds one connection for its lifetime instead of checking one out of
+        the pool per batch, and replaces it only after it breaks.
+        """
+        conn = None
+        try:
+            while self.running or not self._queue.empty():
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                
+                if conn is None or conn.invalidated:
+                    if conn is not None:
+                        conn.close()
+                    try:
+                        conn = self.engine.connect()
+                    except Exception as e:
+                        conn = None
+                        logging.error(f"Error connecting to database, dropping {len(batch)} machine statuses: {e}")
+                        continue
+                
+                self._insert_batch(conn, batch)
         finally:
-            session.close()
+            if conn is not None:
+                conn.close()
 
     def _on_disconnect(self, client, userdata, rc):
         """
@@ -190,6 +387,10 @@ class MachineStatusSubscriber:
         finally:
             # Ensure clean disconnection
             self.client.disconnect()
+            
+            # Let the writer drain the queue
+            self.running = False
+            self.writer_thread.join()
 
 def main():
     # Configuration defaults 
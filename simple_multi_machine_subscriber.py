@@ -1,28 +1,497 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import json
 import time
+import heapq
+import struct
+import queue
+import asyncio
 import argparse
 import threading
+from array import array
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 import paho.mqtt.client as mqtt
+try:
+    import orjson
+    has_orjson = True
+except ImportError:
+    has_orjson = False
+try:
+    import msgspec
+    has_msgspec = True
+except ImportError:
+    has_msgspec = False
+try:
+    import aiomqtt
+    # Before 2.3 client.messages was a plain async generator without len()
+    has_aiomqtt = isinstance(getattr(aiomqtt.Client, 'messages', None), property)
+except ImportError:
+    has_aiomqtt = False
 
-# Global dictionary to store machine statuses
-machines = {}
-# Lock for thread-safe access to the machines dictionary
+# Online status codes stored in MachineTable.status
+STATUS_UNKNOWN = 0
+STATUS_ONLINE = 1
+STATUS_OFFLINE = 2
+STATUS_NAMES = ('unknown', 'online', 'offline')
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# Stored in the byte count columns when a size was not reported
+UNKNOWN_BYTES = -1
+
+# Compact binary sample, accepted alongside JSON. A fixed header whose
+# leading version byte can never start a JSON document:
+#   version, cpu %, memory %, storage %, cores, status,
+#   memory total, memory available, storage total, storage free
+# followed by machine ID, hostname, IP address and CPU model as UTF-8
+# strings separated by NUL bytes. Percentages are hundredths, sizes are
+# bytes (-1 when unknown) and status is a STATUS_* code.
+BINARY_SAMPLE_VERSION = b'\x01'
+BINARY_SAMPLE_HEADER = struct.Struct('<cHHHHBxqqqq')
+
+# Byte unit names and their divisors, indexed by power of 1024
+BYTE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+BYTE_DIVISORS = tuple(1 << (10 * i) for i in range(len(BYTE_UNITS)))
+
+# Console output is buffered per thread and written in one call at natural
+# boundaries (end of a batch, a sweep or a summary), so the threads do not
+# contend on the stdout lock line by line
+_output = threading.local()
+
+def _log(line: str):
+    """
+    Add a line of console output to the calling thread's buffer
+    """
+    lines = getattr(_output, 'lines', None)
+    if lines is None:
+        lines = _output.lines = []
+    lines.append(line)
+
+def _flush_log():
+    """
+    Write the calling thread's buffered output to stdout with a single write
+    """
+    lines = getattr(_output, 'lines', None)
+    if lines:
+        _output.lines = []
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+def format_bytes(bytes_value: Optional[int]) -> str:
+    """
+    Format a byte count into a human-readable string for display
+    """
+    if bytes_value is None:
+        return "Unknown"
+    # Pick the unit from the bit length and scale with integer math
+    bytes_value = int(bytes_value)
+    index = min(max(bytes_value.bit_length() - 1, 0) // 10, len(BYTE_UNITS) - 1)
+    hundredths = bytes_value * 100 // BYTE_DIVISORS[index]
+    return f"{hundredths // 100}.{hundredths % 100:02d} {BYTE_UNITS[index]}"
+
+def parse_byte_string(value: Any) -> Optional[int]:
+    """
+    Convert a legacy human-readable size such as "15.42 GB" to bytes
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        number, unit = str(value).split()
+        return int(float(number) * 1024 ** 'BKMGTP'.index(unit[0].upper()))
+    except (ValueError, IndexError):
+        return None
+
+def byte_count(section: Dict[str, Any], key: str) -> Optional[int]:
+    """
+    Read a size from a payload section, accepting both the raw "<key>_bytes"
+    field and the legacy formatted "<key>" string sent by older publishers
+    """
+    if f'{key}_bytes' in section:
+        return section[f'{key}_bytes']
+    return parse_byte_string(section.get(key))
+
+def _pick_bytes(raw: Optional[int], legacy: Optional[str]) -> Optional[int]:
+    """
+    Pick a size from a decoded payload section, preferring the raw "<key>_bytes"
+    field over the legacy formatted "<key>" string
+    """
+    if raw is not None:
+        return raw
+    return parse_byte_string(legacy)
+
+if has_msgspec:
+    # Typed payload schema decoded straight from the payload bytes, without
+    # an intermediate dict; unknown fields are ignored, missing ones take defaults.
+    # Facts a publisher may send as null are Optional, as the dict path accepts them.
+    # Built with defstruct() because mypyc cannot compile class statements
+    # nested in an if block.
+    CpuInfo = msgspec.defstruct('CpuInfo', [
+        ('model', Optional[str], 'Unknown'),
+        ('cores', Optional[int], 0),
+        ('usage_percent', float, 0.0),
+    ])
+
+    MemoryInfo = msgspec.defstruct('MemoryInfo', [
+        ('total_bytes', Optional[int], None),
+        ('available_bytes', Optional[int], None),
+        ('usage_percent', float, 0.0),
+        # Formatted sizes from older publishers
+        ('total', Optional[str], None),
+        ('available', Optional[str], None),
+    ])
+
+    StorageInfo = msgspec.defstruct('StorageInfo', [
+        ('total_bytes', Optional[int], None),
+        ('free_bytes', Optional[int], None),
+        ('usage_percent', float, 0.0),
+        # Formatted sizes from older publishers
+        ('total', Optional[str], None),
+        ('free', Optional[str], None),
+    ])
+
+    StatusSample = msgspec.defstruct('StatusSample', [
+        ('machine_id', str),
+        ('hostname', Optional[str], 'Unknown'),
+        ('ip_address', Optional[str], ''),
+        ('cpu', CpuInfo, msgspec.field(default_factory=CpuInfo)),
+        ('memory', MemoryInfo, msgspec.field(default_factory=MemoryInfo)),
+        ('storage', StorageInfo, msgspec.field(default_factory=StorageInfo)),
+        ('online_status', str, 'online'),
+    ])
+
+    StatusMessage = msgspec.defstruct('StatusMessage', [
+        ('status', str, 'unknown'),
+    ])
+
+    # Batched publishers send a list of samples in one message
+    SAMPLE_DECODER = msgspec.json.Decoder(Union[StatusSample, List[StatusSample]])  # type: ignore[valid-type]
+    # Decodes to a struct type mypy cannot see through defstruct()
+    STATUS_DECODER: Any = msgspec.json.Decoder(StatusMessage)
+
+def _sample_from_dict(data: Dict[str, Any]) -> tuple:
+    """
+    Flatten a sample parsed into dicts into the field tuple used by _store_sample
+    """
+    # Look each section up once
+    get = data.get
+    cpu = get('cpu') or {}
+    memory = get('memory') or {}
+    storage = get('storage') or {}
+    return (
+        get('hostname', 'Unknown'),
+        get('ip_address', ''),
+        cpu.get('model', 'Unknown'),
+        cpu.get('cores', 0),
+        byte_count(memory, 'total'),
+        byte_count(storage, 'total'),
+        cpu.get('usage_percent', 0),
+        byte_count(memory, 'available'),
+        memory.get('usage_percent', 0),
+        byte_count(storage, 'free'),
+        storage.get('usage_percent', 0),
+        get('online_status', 'online')
+    )
+
+def _sample_from_struct(sample: Any) -> tuple:
+    """
+    Flatten a msgspec-decoded sample into the field tuple used by _store_sample
+    """
+    cpu, memory, storage = sample.cpu, sample.memory, sample.storage
+    return (
+        sample.hostname,
+        sample.ip_address,
+        cpu.model,
+        cpu.cores,
+        _pick_bytes(memory.total_bytes, memory.total),
+        _pick_bytes(storage.total_bytes, storage.total),
+        cpu.usage_percent,
+        _pick_bytes(memory.available_bytes, memory.available),
+        memory.usage_percent,
+        _pick_bytes(storage.free_bytes, storage.free),
+        storage.usage_percent,
+        sample.online_status
+    )
+
+def _binary_bytes(value: int) -> Optional[int]:
+    """
+    Decode a size field of a binary sample
+    """
+    return None if value < 0 else value
+
+def _sample_from_binary(payload: bytes) -> tuple:
+    """
+    Unpack a binary sample into its machine ID and the field tuple used by
+    _store_sample
+    """
+    (_, cpu_pct, mem_pct, storage_pct, cores, status,
+     memory_total, memory_available, storage_total, storage_free) = BINARY_SAMPLE_HEADER.unpack_from(payload)
+    strings = payload[BINARY_SAMPLE_HEADER.size:].decode('utf-8', 'replace').split('\0')
+    if len(strings) != 4:
+        raise struct.error(f"expected 4 strings, got {len(strings)}")
+    machine_id, hostname, ip_address, cpu_model = strings
+    return machine_id, (
+        hostname,
+        ip_address,
+        cpu_model,
+        cores,
+        _binary_bytes(memory_total),
+        _binary_bytes(storage_total),
+        cpu_pct / 100,
+        _binary_bytes(memory_available),
+        mem_pct / 100,
+        _binary_bytes(storage_free),
+        storage_pct / 100,
+        STATUS_NAMES[status] if status < len(STATUS_NAMES) else 'unknown'
+    )
+
+def _or_unknown(bytes_value: Optional[int]) -> int:
+    """
+    Map a missing byte count to the UNKNOWN_BYTES column sentinel
+    """
+    return UNKNOWN_BYTES if bytes_value is None else bytes_value
+
+def _percent(value: Any) -> int:
+    """
+    Encode a usage percentage as hundredths of a percent for a binary sample
+    """
+    return min(max(int(round((value or 0) * 100)), 0), 10000)
+
+def encode_binary_sample(data: Dict[str, Any]) -> bytes:
+    """
+    Pack a status sample, in the JSON payload's dict layout, into the binary
+    format; for publishers that want to send the compact form
+    
+    :param data: Status sample as published in JSON
+    :return: Binary payload
+    """
+    cpu = data.get('cpu') or {}
+    memory = data.get('memory') or {}
+    storage = data.get('storage') or {}
+    header = BINARY_SAMPLE_HEADER.pack(
+        BINARY_SAMPLE_VERSION,
+        _percent(cpu.get('usage_percent')),
+        _percent(memory.get('usage_percent')),
+        _percent(storage.get('usage_percent')),
+        cpu.get('cores') or 0,
+        STATUS_CODES.get(data.get('online_status', 'online'), STATUS_UNKNOWN),
+        _or_unknown(byte_count(memory, 'total')),
+        _or_unknown(byte_count(memory, 'available')),
+        _or_unknown(byte_count(storage, 'total')),
+        _or_unknown(byte_count(storage, 'free'))
+    )
+    strings = (data.get('machine_id'), data.get('hostname'), data.get('ip_address'), cpu.get('model'))
+    return header + '\0'.join(str(value or '').replace('\0', '') for value in strings).encode('utf-8')
+
+def _scan_status(payload: bytes) -> Optional[str]:
+    """
+    Extract the "status" string from a small status heartbeat with bytes.find
+    instead of a JSON parse. Returns None if the payload does not have the
+    expected shape, so the caller can fall back to a full parse.
+    """
+    key = payload.find(b'"status"')
+    if key < 0:
+        return None
+    colon = payload.find(b':', key + 8)
+    start = payload.find(b'"', colon + 1)
+    # Only whitespace may appear around the colon
+    if colon < 0 or start < 0 or payload[key + 8:colon].strip() or payload[colon + 1:start].strip():
+        return None
+    end = payload.find(b'"', start + 1)
+    if end < 0:
+        return None
+    try:
+        return payload[start + 1:end].decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+class MachineRecord:
+    """
+    Descriptive facts about a machine that rarely change between updates.
+    Slotted so each record is a fixed-size object without an instance dict.
+    """
+    __slots__ = ('hostname', 'ip_address', 'cpu_model', 'cpu_cores', 'memory_total', 'storage_total')
+
+    def __init__(
+        self,
+        hostname: Optional[str] = 'Unknown',
+        ip_address: Optional[str] = '',
+        cpu_model: Optional[str] = 'Unknown',
+        cpu_cores: Optional[int] = 0,
+        memory_total: Optional[int] = None,
+        storage_total: Optional[int] = None
+    ):
+        self.hostname = hostname
+        self.ip_address = ip_address
+        self.cpu_model = cpu_model
+        self.cpu_cores = cpu_cores
+        self.memory_total = memory_total
+        self.storage_total = storage_total
+
+class MachineTable:
+    """
+    Machine statuses stored column-wise: one list or array per field, indexed
+    by the row number interned for each machine ID. An update writes scalars
+    into existing rows instead of allocating a nested dict per message.
+    """
+    def __init__(self) -> None:
+        self.id_to_idx: Dict[str, int] = {}
+        self.machine_ids: List[str] = []
+        # Per-machine facts; the arrays below hold the frequently changing metrics
+        self.records: List[MachineRecord] = []
+        self.cpu_pct = array('d')
+        self.mem_available = array('q')
+        self.mem_pct = array('d')
+        self.storage_free = array('q')
+        self.storage_pct = array('d')
+        # time.monotonic() of the last update
+        self.last_seen = array('d')
+        # One of the STATUS_* codes
+        self.status = array('b')
+        # Changed by touch() after every write; readers compare it to tell
+        # whether a cached snapshot is still current
+        self.version = 0
+        self._version_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        # Only rows whose index has been published are complete
+        return len(self.id_to_idx)
+
+    def add(self, machine_id: str) -> int:
+        """
+        Append an empty row for a new machine and return its index
+        """
+        idx = len(self.machine_ids)
+        self.machine_ids.append(machine_id)
+        self.records.append(MachineRecord())
+        self.cpu_pct.append(0.0)
+        self.mem_available.append(UNKNOWN_BYTES)
+        self.mem_pct.append(0.0)
+        self.storage_free.append(UNKNOWN_BYTES)
+        self.storage_pct.append(0.0)
+        self.last_seen.append(time.monotonic())
+        self.status.append(STATUS_UNKNOWN)
+        # Publish the index last so lock-free lookups never see a partial row
+        self.id_to_idx[machine_id] = idx
+        self.touch()
+        return idx
+
+    def touch(self) -> None:
+        """
+        Record that rows changed; call after the writes are done
+        """
+        with self._version_lock:
+            self.version += 1
+
+    def row(self, idx: int, wall_offset: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Materialize one machine as the nested dict returned by get_machine_status
+        
+        :param idx: Row index
+        :param wall_offset: time.time() - time.monotonic(), when building many rows
+        """
+        if wall_offset is None:
+            wall_offset = time.time() - time.monotonic()
+
+        def size(column):
+            return None if column[idx] == UNKNOWN_BYTES else column[idx]
+
+        record = self.records[idx]
+        return {
+            'hostname': record.hostname,
+            'ip_address': record.ip_address,
+            'cpu': {
+                'model': record.cpu_model,
+                'cores': record.cpu_cores,
+                'usage_percent': self.cpu_pct[idx]
+            },
+            'memory': {
+                'total_bytes': record.memory_total,
+                'available_bytes': size(self.mem_available),
+                'usage_percent': self.mem_pct[idx]
+            },
+            'storage': {
+                'total_bytes': record.storage_total,
+                'free_bytes': size(self.storage_free),
+                'usage_percent': self.storage_pct[idx]
+            },
+            'online_status': STATUS_NAMES[self.status[idx]],
+            # Convert the monotonic timestamp back to wall-clock time
+            'last_seen': datetime.fromtimestamp(self.last_seen[idx] + wall_offset)
+        }
+
+# Global table of machine statuses.
+#
+# Thread safety does not rely on the GIL, so the table is also safe on
+# free-threaded (Py_GIL_DISABLED) builds where the threads run in parallel:
+# - every read or write of a row's columns holds that row's shard lock
+# - adding a row holds machines_lock and every shard lock, because appending
+#   may reallocate the column arrays under concurrent readers
+# - shared values that readers access without a lock (records, the snapshot)
+#   are replaced whole with one store, never modified in place
+machines = MachineTable()
+# Lock held while rows are added to the machines table
 machines_lock = threading.Lock()
+# Row updates are guarded by one of several locks chosen by machine ID, so
+# writers and readers of different machines do not contend
+MACHINE_LOCK_SHARDS = 16
+machine_locks = [threading.Lock() for _ in range(MACHINE_LOCK_SHARDS)]
+
+# Maximum number of queued messages applied per pass of the drain thread
+DRAIN_BATCH_SIZE = 256
+# Maximum number of machine updates held for verbose printing; older ones are dropped
+VERBOSE_BACKLOG = 1000
+# Seconds the asyncio subscriber waits before reconnecting to the broker
+RECONNECT_INTERVAL = 5
+
+# (table version, result) of get_machine_status() for all machines, rebuilt
+# only when the table's version has moved on; swapped as one tuple so
+# lock-free readers never pair a version with the wrong result
+_snapshot: Tuple[int, Dict[str, Dict[str, Any]]] = (-1, {})
+_snapshot_lock = threading.Lock()
+
+def _shard_index(machine_id: str) -> int:
+    """
+    Return the index of the lock guarding the given machine's row
+    """
+    return hash(machine_id) % MACHINE_LOCK_SHARDS
+
+def _shard_lock(machine_id: str) -> threading.Lock:
+    """
+    Return the lock guarding the given machine's row
+    """
+    return machine_locks[_shard_index(machine_id)]
+
+def _row_index(machine_id: str) -> int:
+    """
+    Return the machine's row index, adding a row the first time it is seen
+    """
+    idx = machines.id_to_idx.get(machine_id)
+    if idx is None:
+        with machines_lock:
+            idx = machines.id_to_idx.get(machine_id)
+            if idx is None:
+                for lock in machine_locks:
+                    lock.acquire()
+                try:
+                    idx = machines.add(machine_id)
+                finally:
+                    for lock in machine_locks:
+                        lock.release()
+    return idx
 
 class MachineStatusSubscriber:
     def __init__(
         self, 
         broker_address: str = 'localhost', 
         broker_port: int = 1883, 
-        username: str = None, 
-        password: str = None,
-        offline_threshold: int = 60  # Seconds before marking a machine as offline
-    ):
+        username: Optional[str] = None, 
+        password: Optional[str] = None,
+        offline_threshold: int = 60,  # Seconds before marking a machine as offline
+        verbose: bool = False
+    ) -> None:
         """
         Initialize MQTT Machine Status Subscriber
         
@@ -31,14 +500,26 @@ class MachineStatusSubscriber:
         :param username: MQTT Broker username (optional)
         :param password: MQTT Broker password (optional)
         :param offline_threshold: Time in seconds before a machine is considered offline
+        :param verbose: Keep every machine update for print_pending_updates()
         """
-        # MQTT Client setup
-        self.client = mqtt.Client()
+        # MQTT Client setup; paho >= 2.0 uses the VERSION2 callback API,
+        # paho 1.x only has the legacy one
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self.client = mqtt.Client()
         self.broker_address = broker_address
         self.broker_port = broker_port
         self.offline_threshold = offline_threshold
         
+        # Rows captured for verbose output; formatted later by print_pending_updates()
+        # so the drain thread never spends time on printing
+        self.verbose = verbose
+        self.pending_updates: deque = deque(maxlen=VERBOSE_BACKLOG)
+        
         # Set up MQTT authentication if provided
+        self.username = username
+        self.password = password
         if username and password:
             self.client.username_pw_set(username, password)
         
@@ -51,85 +532,235 @@ class MachineStatusSubscriber:
         self.connected = False
         self.running = False
         
+        # Messages are queued by the MQTT callback and applied by a drain thread
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.drain_thread: Optional[threading.Thread] = None
+        
+        # Min-heap of (deadline, row index) for rows that may go offline; each
+        # watched row has one entry, and the offline detector sleeps until the
+        # earliest deadline instead of polling the whole table
+        self._deadlines: List[Tuple[float, int]] = []
+        self._watched: Set[int] = set()
+        self._deadline_cond = threading.Condition()
+        
         # Start offline detector thread
-        self.offline_detector_thread = None
+        self.offline_detector_thread: Optional[threading.Thread] = None
 
-    def _on_connect(self, client, userdata, flags, rc):
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
         """
-        MQTT connection callback
+        MQTT connection callback (properties is only passed by the VERSION2 API)
         """
-        if rc == 0:
+        if reason_code == 0:
             print(f"Connected to MQTT Broker at {self.broker_address}:{self.broker_port}")
             # Subscribe to all machine status topics
             client.subscribe("machine_status/#")
             self.connected = True
         else:
-            print(f"Failed to connect to MQTT Broker. Return code: {rc}")
+            print(f"Failed to connect to MQTT Broker. Return code: {reason_code}")
 
-    def _on_message(self, client, userdata, msg):
+    def _on_message(self, client: Any, userdata: Any, msg: Any) -> None:
         """
-        Callback for when a message is received from the server
+        Callback for when a message is received from the server. The message is
+        only queued here; parsing and table updates happen on the drain thread.
         """
-        try:
-            # Decode payload
-            payload = msg.payload.decode('utf-8')
-            data = json.loads(payload)
+        self._queue.put_nowait((msg.topic, msg.payload))
+
+    def _drain_loop(self) -> None:
+        """
+        Background thread that applies queued messages in batches
+        """
+        get_nowait = self._queue.get_nowait
+        while True:
+            # Block for the first message, then take whatever else is already queued
+            item = self._queue.get()
+            batch: List[tuple] = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= DRAIN_BATCH_SIZE:
+                    break
+                try:
+                    item = get_nowait()
+                except queue.Empty:
+                    break
             
-            # Extract topic parts
-            topic_parts = msg.topic.split('/')
+            if batch:
+                self._apply_batch(batch)
+            # None is queued by stop() to end the thread
+            if item is None:
+                return
+
+    def _decode(self, topic: str, payload: bytes) -> Optional[tuple]:
+        """
+        Parse one message into (machine_id, status, sample), where exactly one
+        of status and sample (a field tuple) is set, or None if the message
+        carries no update
+        """
+        # Dispatch on the topic before parsing anything:
+        # machine_status/<machine_id> or machine_status/<machine_id>/status
+        _, _, rest = topic.partition('/')
+        topic_machine_id, _, subtopic = rest.partition('/')
+        if subtopic and subtopic != 'status':
+            return None
+        
+        # Status heartbeats are tiny; read the status without parsing when possible
+        if subtopic:
+            status = _scan_status(payload)
+            if status is not None:
+                return topic_machine_id, status, None
+        # Binary samples are unpacked with one struct call; JSON is the fallback
+        elif payload[:1] == BINARY_SAMPLE_VERSION:
+            try:
+                machine_id, sample = _sample_from_binary(payload)
+            except struct.error:
+                _log(f"Malformed binary sample from topic {topic} ({len(payload)} bytes)")
+                return None
+            return machine_id, None, sample
+        
+        if has_msgspec:
+            return self._decode_typed(topic, topic_machine_id, subtopic, payload)
+        
+        try:
+            # Decode payload; orjson and json.loads both take the raw bytes, so no str copy is made
+            if has_orjson:
+                data = orjson.loads(payload)
+            else:
+                data = json.loads(payload)
             
             # Handle status-specific messages (machine_status/<machine_id>/status)
-            if len(topic_parts) >= 3 and topic_parts[2] == "status":
-                machine_id = topic_parts[1]
-                status = data.get('status', 'unknown')
-                
-                # Update machine status if it exists
-                with machines_lock:
-                    if machine_id in machines:
-                        machines[machine_id]['online_status'] = status
-                        print(f"Machine {machine_id} status updated to: {status}")
-                return
+            if subtopic:
+                return topic_machine_id, data.get('status', 'unknown'), None
+            
+            # Batched publishers send a list of samples; keep only the newest
+            if isinstance(data, list):
+                data = data[-1] if data else {}
             
             # Handle regular machine status updates (machine_status/<machine_id>)
             if 'machine_id' in data:
-                machine_id = data.get('machine_id')
-                
-                # Create or update machine in the dictionary
-                with machines_lock:
-                    machines[machine_id] = {
-                        'hostname': data.get('hostname', 'Unknown'),
-                        'ip_address': data.get('ip_address', ''),
-                        'cpu': {
-                            'model': data.get('cpu', {}).get('model', 'Unknown'),
-                            'cores': data.get('cpu', {}).get('cores', 0),
-                            'usage_percent': data.get('cpu', {}).get('usage_percent', 0)
-                        },
-                        'memory': {
-                            'total': data.get('memory', {}).get('total', 'Unknown'),
-                            'available': data.get('memory', {}).get('available', 'Unknown'),
-                            'usage_percent': data.get('memory', {}).get('usage_percent', 0)
-                        },
-                        'storage': {
-                            'total': data.get('storage', {}).get('total', 'Unknown'),
-                            'free': data.get('storage', {}).get('free', 'Unknown'),
-                            'usage_percent': data.get('storage', {}).get('usage_percent', 0)
-                        },
-                        'online_status': data.get('online_status', 'online'),
-                        'last_seen': datetime.now()
-                    }
-                
-                # Print machine information if requested
-                self._print_machine_update(machine_id, machines[machine_id])
+                return data['machine_id'], None, _sample_from_dict(data)
         
-        except json.JSONDecodeError:
-            print(f"Failed to decode JSON from topic {msg.topic}")
+        except ValueError:
+            # json.JSONDecodeError and orjson.JSONDecodeError both subclass ValueError
+            _log(f"Failed to decode JSON from topic {topic}: {payload[:80]!r}")
         except Exception as e:
-            print(f"Error processing message: {e}")
+            _log(f"Error processing message: {e}")
+        return None
 
-    def _on_disconnect(self, client, userdata, rc):
+    def _decode_typed(self, topic: str, topic_machine_id: str, subtopic: str, payload: bytes) -> Optional[tuple]:
+        """
+        Variant of _decode that validates the payload against the msgspec schema
         """
-        MQTT disconnection callback
+        try:
+            # Handle status-specific messages (machine_status/<machine_id>/status)
+            if subtopic:
+                return topic_machine_id, STATUS_DECODER.decode(payload).status, None
+            
+            sample = SAMPLE_DECODER.decode(payload)
+            # Batched publishers send a list of samples; keep only the newest
+            if isinstance(sample, list):
+                if not sample:
+                    return None
+                sample = sample[-1]
+            return sample.machine_id, None, _sample_from_struct(sample)
+        
+        except msgspec.ValidationError as e:
+            _log(f"Invalid status payload from topic {topic}: {e}")
+        except msgspec.DecodeError:
+            _log(f"Failed to decode JSON from topic {topic}: {payload[:80]!r}")
+        except Exception as e:
+            _log(f"Error processing message: {e}")
+        return None
+
+    def _apply_batch(self, batch: List[tuple]) -> None:
         """
+        Apply a batch of queued messages, taking each shard lock once per batch
+        """
+        # Parse outside any lock and group the updates by shard; per-machine
+        # ordering is kept because a machine always maps to the same shard.
+        # Rows for new machines are added now, as that takes every shard lock.
+        shards: Dict[int, List[tuple]] = {}
+        for topic, payload in batch:
+            update = self._decode(topic, payload)
+            if update is not None:
+                if update[2] is not None:
+                    _row_index(update[0])
+                shards.setdefault(_shard_index(update[0]), []).append(update)
+        
+        touched: List[Tuple[int, float]] = []
+        verbose = self.verbose
+        # One clock read stamps the whole batch
+        now = time.monotonic()
+        for shard, updates in shards.items():
+            with machine_locks[shard]:
+                for machine_id, status, sample in updates:
+                    if sample is None:
+                        # Update machine status if it exists
+                        idx = machines.id_to_idx.get(machine_id)
+                        if idx is not None:
+                            machines.status[idx] = STATUS_CODES.get(status, STATUS_UNKNOWN)
+                            _log(f"Machine {machine_id} status updated to: {status}")
+                            touched.append((idx, machines.last_seen[idx]))
+                    else:
+                        idx = machines.id_to_idx[machine_id]
+                        self._store_sample(idx, sample, now)
+                        touched.append((idx, now))
+                        if verbose:
+                            self.pending_updates.append((machine_id, machines.row(idx)))
+        
+        # Rows already on the deadline heap are re-checked when their entry comes due
+        watched = self._watched
+        for idx, last_seen in touched:
+            if idx not in watched:
+                self._watch(idx, last_seen + self.offline_threshold)
+        
+        if shards:
+            machines.touch()
+        _flush_log()
+
+    def _watch(self, idx: int, deadline: float) -> None:
+        """
+        Schedule an offline check of a row, unless one is already scheduled
+        """
+        with self._deadline_cond:
+            if idx in self._watched:
+                return
+            self._watched.add(idx)
+            heapq.heappush(self._deadlines, (deadline, idx))
+            # Wake the detector if this is now the earliest deadline
+            if self._deadlines[0][1] == idx:
+                self._deadline_cond.notify()
+
+    def _store_sample(self, idx: int, sample: tuple, now: float) -> None:
+        """
+        Write one status sample (a field tuple from _decode) received at
+        monotonic time now into an existing row; the caller holds the row's
+        shard lock
+        """
+        (hostname, ip_address, cpu_model, cpu_cores, memory_total, storage_total,
+         cpu_pct, mem_available, mem_pct, storage_free, storage_pct, online_status) = sample
+        table = machines
+        
+        # Descriptive facts rarely change, so the existing record is kept unless
+        # one of them differs; a changed record is replaced whole, never mutated,
+        # so readers holding the old one see consistent values
+        record = table.records[idx]
+        if (record.hostname != hostname or record.ip_address != ip_address
+                or record.cpu_model != cpu_model or record.cpu_cores != cpu_cores
+                or record.memory_total != memory_total or record.storage_total != storage_total):
+            table.records[idx] = MachineRecord(hostname, ip_address, cpu_model, cpu_cores, memory_total, storage_total)
+        table.cpu_pct[idx] = cpu_pct
+        table.mem_available[idx] = _or_unknown(mem_available)
+        table.mem_pct[idx] = mem_pct
+        table.storage_free[idx] = _or_unknown(storage_free)
+        table.storage_pct[idx] = storage_pct
+        table.status[idx] = STATUS_CODES.get(online_status, STATUS_UNKNOWN)
+        table.last_seen[idx] = now
+
+    def _on_disconnect(self, client, userdata, flags_or_rc, reason_code=None, properties=None):
+        """
+        MQTT disconnection callback. The VERSION2 API passes
+        (disconnect_flags, reason_code, properties); the legacy API passes only rc.
+        """
+        rc = flags_or_rc if reason_code is None else reason_code
         print(f"Disconnected from MQTT Broker. Return code: {rc}")
         self.connected = False
         # Attempt to reconnect if needed
@@ -143,31 +774,78 @@ class MachineStatusSubscriber:
         """
         Print information about a specific machine update (if printing is enabled)
         """
-        print(f"\n===== Machine Status Update: {machine_id} =====")
-        print(f"Hostname: {machine['hostname']}")
-        print(f"IP Address: {machine['ip_address']}")
-        print(f"CPU: {machine['cpu']['usage_percent']:.1f}% ({machine['cpu']['cores']} cores)")
-        print(f"Memory: {machine['memory']['usage_percent']:.1f}% (Total: {machine['memory']['total']})")
-        print(f"Storage: {machine['storage']['usage_percent']:.1f}% (Free: {machine['storage']['free']})")
-        print(f"Status: {machine['online_status']}")
-        print("=" * 50)
+        _log(f"\n===== Machine Status Update: {machine_id} =====")
+        _log(f"Hostname: {machine['hostname']}")
+        _log(f"IP Address: {machine['ip_address']}")
+        _log(f"CPU: {machine['cpu']['usage_percent']:.1f}% ({machine['cpu']['cores']} cores)")
+        _log(f"Memory: {machine['memory']['usage_percent']:.1f}% (Total: {format_bytes(machine['memory']['total_bytes'])})")
+        _log(f"Storage: {machine['storage']['usage_percent']:.1f}% (Free: {format_bytes(machine['storage']['free_bytes'])})")
+        _log(f"Status: {machine['online_status']}")
+        _log("=" * 50)
+
+    def print_pending_updates(self):
+        """
+        Print the machine updates captured since the last call (verbose mode)
+        """
+        pending = self.pending_updates
+        while pending:
+            machine_id, machine = pending.popleft()
+            self._print_machine_update(machine_id, machine)
+        _flush_log()
+
+    def _expire_due(self) -> Optional[float]:
+        """
+        Mark watched rows whose deadline has passed as offline, re-arming those
+        updated in the meantime. Returns the seconds until the next deadline,
+        or None when no row is watched.
+        """
+        threshold = self.offline_threshold
+        status = machines.status
+        deadlines = self._deadlines
+        now = time.monotonic()
+        while True:
+            with self._deadline_cond:
+                if not deadlines:
+                    return None
+                delay = deadlines[0][0] - now
+                if delay > 0:
+                    return delay
+                _, idx = heapq.heappop(deadlines)
+                self._watched.discard(idx)
+            
+            # The row may have been updated since the entry was pushed; rows
+            # already offline are watched again on their next update
+            machine_id = machines.machine_ids[idx]
+            with _shard_lock(machine_id):
+                offline = status[idx] == STATUS_OFFLINE
+                deadline = machines.last_seen[idx] + threshold
+                stale = not offline and deadline <= now
+                if stale:
+                    status[idx] = STATUS_OFFLINE
+            
+            if stale:
+                machines.touch()
+                _log(f"Machine {machine_id} ({machines.records[idx].hostname}) marked as offline - no data for {threshold}s")
+            elif not offline:
+                self._watch(idx, deadline)
 
-    def _offline_detector(self):
+    def _offline_detector(self) -> None:
         """
         Background thread to detect offline machines
         """
+        deadlines = self._deadlines
+        cond = self._deadline_cond
         while self.running:
-            now = datetime.now()
-            with machines_lock:
-                for machine_id, machine in list(machines.items()):
-                    if 'last_seen' in machine and machine['online_status'] != 'offline':
-                        time_diff = now - machine['last_seen']
-                        if time_diff.total_seconds() > self.offline_threshold:
-                            print(f"Machine {machine_id} ({machine['hostname']}) marked as offline - no data for {self.offline_threshold}s")
-                            machines[machine_id]['online_status'] = 'offline'
+            self._expire_due()
+            # Write out this round's offline notices before going to sleep
+            _flush_log()
             
-            # Check every 5 seconds
-            time.sleep(5)
+            # Sleep until the earliest deadline (indefinitely when nothing is
+            # watched), or until _watch() or stop() wakes us
+            with cond:
+                delay = deadlines[0][0] - time.monotonic() if deadlines else None
+                if self.running and (delay is None or delay > 0):
+                    cond.wait(delay)
 
     def start(self):
         """
@@ -177,6 +855,11 @@ class MachineStatusSubscriber:
             return
             
         self.running = True
+        
+        # Start the drain thread before any message can arrive
+        self.drain_thread = threading.Thread(target=self._drain_loop, daemon=True)
+        self.drain_thread.start()
+        
         try:
             # Connect to the broker
             self.client.connect(self.broker_address, self.broker_port, 60)
@@ -195,6 +878,7 @@ class MachineStatusSubscriber:
         except Exception as e:
             print(f"Error connecting to broker {self.broker_address}: {e}")
             self.running = False
+            self._queue.put(None)
     
     def stop(self):
         """
@@ -207,71 +891,197 @@ class MachineStatusSubscriber:
         self.client.loop_stop()
         if self.connected:
             self.client.disconnect()
+        with self._deadline_cond:
+            self._deadline_cond.notify()
+        # Let the drain thread apply what is already queued, then exit
+        self._queue.put(None)
+
+
+class AsyncMachineStatusSubscriber(MachineStatusSubscriber):
+    """
+    asyncio variant of MachineStatusSubscriber built on aiomqtt. Messages are
+    applied and offline deadlines checked on the event loop, so no drain or
+    detector threads are started; the machine table and get_machine_status()
+    are shared with the threaded subscriber.
+    """
+
+    async def run(self):
+        """
+        Connect to the broker and process messages until stop() is called or
+        the task is cancelled, reconnecting whenever the connection drops.
+        Either way the task ends cancelled, so awaiting it raises
+        asyncio.CancelledError.
+        """
+        if not has_aiomqtt:
+            raise RuntimeError("AsyncMachineStatusSubscriber requires aiomqtt 2.3 or newer")
+        
+        self.running = True
+        self._task = asyncio.current_task()
+        offline_task = asyncio.create_task(self._offline_loop())
+        print(f"Monitoring machine status with {self.offline_threshold}s offline threshold")
+        try:
+            while self.running:
+                try:
+                    # Each connection runs as its own task: under mypyc a
+                    # cancellation unwinding through aiomqtt's async exit
+                    # is lost when one compiled coroutine awaits another
+                    await asyncio.create_task(self._consume())
+                except aiomqtt.MqttError as e:
+                    self.connected = False
+                    print(f"Disconnected from MQTT Broker: {e}. Reconnecting in {RECONNECT_INTERVAL}s")
+                    await asyncio.sleep(RECONNECT_INTERVAL)
+        finally:
+            self.running = False
+            self.connected = False
+            offline_task.cancel()
+
+    async def _consume(self):
+        """
+        Hold one broker connection and apply its messages in batches
+        """
+        async with aiomqtt.Client(
+            self.broker_address,
+            self.broker_port,
+            username=self.username,
+            password=self.password
+        ) as client:
+            self.connected = True
+            print(f"Connected to MQTT Broker at {self.broker_address}:{self.broker_port}")
+            await client.subscribe("machine_status/#")
+            
+            messages = client.messages
+            async for message in messages:
+                batch = [(message.topic.value, message.payload)]
+                # Take whatever else has already arrived; these do not block
+                for _ in range(min(len(messages), DRAIN_BATCH_SIZE - 1)):
+                    message = await messages.__anext__()
+                    batch.append((message.topic.value, message.payload))
+                self._apply_batch(batch)
+
+    async def _offline_loop(self):
+        """
+        Task that marks machines offline as their deadlines pass
+        """
+        threshold = self.offline_threshold
+        while True:
+            delay = self._expire_due()
+            _flush_log()
+            # New rows are watched with deadlines at least one threshold away,
+            # so never sleeping longer than that keeps detection on time
+            await asyncio.sleep(threshold if delay is None else min(delay, threshold))
+
+    def start(self):
+        """
+        Not used by the asyncio subscriber; await run() instead
+        """
+        raise RuntimeError("Use 'await subscriber.run()' with AsyncMachineStatusSubscriber")
+
+    def stop(self):
+        """
+        Cancel the running run() task; call from the event loop thread
+        """
+        if not self.running:
+            return
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
 
 
 def print_all_machines():
     """
     Print a summary of all machines
     """
-    with machines_lock:
-        if not machines:
-            print("No machines connected yet")
-            return
-            
-        print("\n===== MACHINE STATUS SUMMARY =====")
-        print(f"Total machines: {len(machines)}")
-        print("=" * 60)
+    # Copy each row under its shard lock, then format without holding any lock
+    now = time.monotonic()
+    rows = []
+    for idx in range(len(machines)):
+        machine_id = machines.machine_ids[idx]
+        with _shard_lock(machine_id):
+            rows.append((
+                machines.records[idx],
+                machines.status[idx],
+                now - machines.last_seen[idx],
+                machines.cpu_pct[idx],
+                machines.mem_pct[idx],
+                machines.storage_pct[idx]
+            ))
+    
+    if not rows:
+        print("No machines connected yet")
+        return
         
-        # Sort machines by hostname
-        sorted_machines = sorted(machines.items(), key=lambda x: x[1]['hostname'])
+    # Collect the whole summary and emit it with a single write
+    _log("\n===== MACHINE STATUS SUMMARY =====")
+    _log(f"Total machines: {len(rows)}")
+    _log("=" * 60)
+    
+    # Sort machines by hostname
+    rows.sort(key=lambda row: row[0].hostname or '')
+    
+    for record, status_code, elapsed, cpu_pct, mem_pct, storage_pct in rows:
+        # Calculate time since last seen
+        if elapsed < 60:
+            last_seen = f"{int(elapsed)} seconds ago"
+        else:
+            last_seen = f"{int(elapsed / 60)} minutes ago"
         
-        for machine_id, machine in sorted_machines:
-            # Calculate time since last seen
-            if 'last_seen' in machine:
-                time_diff = datetime.now() - machine['last_seen']
-                if time_diff.total_seconds() < 60:
-                    last_seen = f"{int(time_diff.total_seconds())} seconds ago"
-                else:
-                    last_seen = f"{int(time_diff.total_seconds() / 60)} minutes ago"
-            else:
-                last_seen = "Unknown"
-            
-            # Format status
-            if machine['online_status'] == 'online':
-                status = "ONLINE"
-            elif machine['online_status'] == 'offline':
-                status = "OFFLINE"
-            else:
-                status = "UNKNOWN"
-            
-            print(f"{machine['hostname']} ({machine['ip_address']})")
-            print(f"  Status: {status}, Last seen: {last_seen}")
-            print(f"  CPU: {machine['cpu']['usage_percent']:.1f}%, Memory: {machine['memory']['usage_percent']:.1f}%, Storage: {machine['storage']['usage_percent']:.1f}%")
-            print("-" * 60)
+        # Format status
+        status = STATUS_NAMES[status_code].upper()
         
-        print("")
+        _log(f"{record.hostname} ({record.ip_address})")
+        _log(f"  Status: {status}, Last seen: {last_seen}")
+        _log(f"  CPU: {cpu_pct:.1f}%, Memory: {mem_pct:.1f}%, Storage: {storage_pct:.1f}%")
+        _log("-" * 60)
+    
+    _log("")
+    _flush_log()
 
-def get_machine_status(machine_id: str = None) -> Dict:
+def get_machine_status(machine_id: Optional[str] = None) -> Dict:
     """
     Get the current status of machines
     
     :param machine_id: Specific machine ID to query, or None for all machines
-    :return: Dict containing machine status information
+    :return: Dict containing machine status information. The dict returned for
+             all machines is a shared snapshot and must not be modified.
     """
-    with machines_lock:
-        if machine_id is not None:
-            return machines.get(machine_id, {}).copy()
-        else:
-            # Return a copy to avoid thread safety issues
-            return machines.copy()
+    global _snapshot
+    
+    if machine_id is not None:
+        idx = machines.id_to_idx.get(machine_id)
+        if idx is None:
+            return {}
+        with _shard_lock(machine_id):
+            return machines.row(idx)
+    
+    # Reuse the last snapshot while nothing has changed; otherwise rebuild it
+    # off the ingest path. The version is read first so that writes racing
+    # with the rebuild leave the new snapshot marked stale.
+    snapshot_version, snapshot = _snapshot
+    if snapshot_version == machines.version:
+        return snapshot
+    with _snapshot_lock:
+        version = machines.version
+        snapshot_version, snapshot = _snapshot
+        if snapshot_version == version:
+            return snapshot
+        with machines_lock:
+            index = list(machines.id_to_idx.items())
+        snapshot = {}
+        wall_offset = time.time() - time.monotonic()
+        for mid, idx in index:
+            with _shard_lock(mid):
+                snapshot[mid] = machines.row(idx, wall_offset)
+        _snapshot = (version, snapshot)
+        return snapshot
 
 def start_monitoring(
     broker_address: str = 'localhost',
     broker_port: int = 1883,
-    username: str = None,
-    password: str = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
     offline_threshold: int = 60,
-    update_interval: int = 10
+    update_interval: int = 10,
+    verbose: bool = False
 ) -> MachineStatusSubscriber:
     """
     Start monitoring multiple machines from a single MQTT broker
@@ -282,6 +1092,7 @@ def start_monitoring(
     :param password: Optional password for broker authentication
     :param offline_threshold: Time in seconds before a machine is considered offline
     :param update_interval: Time in seconds between summary updates (0 to disable)
+    :param verbose: Print every machine update received, not just the summaries
     :return: MachineStatusSubscriber instance
     """
     # Create and start the subscriber
@@ -290,19 +1101,23 @@ def start_monitoring(
         broker_port=broker_port,
         username=username,
         password=password,
-        offline_threshold=offline_threshold
+        offline_threshold=offline_threshold,
+        verbose=verbose
     )
     
     # Start the subscriber
     subscriber.start()
     
-    # Start update loop in a separate thread if needed
-    if update_interval > 0:
+    # Start update loop in a separate thread if needed; it also formats the
+    # verbose machine updates, checking for them every second when summaries are off
+    if update_interval > 0 or verbose:
         def update_loop():
             try:
                 while True:
-                    time.sleep(update_interval)
-                    print_all_machines()
+                    time.sleep(update_interval or 1)
+                    subscriber.print_pending_updates()
+                    if update_interval > 0:
+                        print_all_machines()
             except Exception as e:
                 print(f"Error in update loop: {e}")
         
@@ -324,6 +1139,8 @@ def parse_arguments():
                         help='Time in seconds before a machine is considered offline (default: 60)')
     parser.add_argument('--update-interval', '-i', type=int, default=10,
                         help='Time in seconds between summary updates (default: 10)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help='Print every machine update received, not just the summaries')
     return parser.parse_args()
 
 def run_from_command_line():
@@ -337,7 +1154,8 @@ def run_from_command_line():
         username=args.username,
         password=args.password,
         offline_threshold=args.offline_threshold,
-        update_interval=args.update_interval
+        update_interval=args.update_interval,
+        verbose=args.verbose
     )
     
     try: